@@ -1,9 +1,16 @@
+import asyncio
 import logging
 import os
+import queue
 import re
-from typing import Optional
+from logging.handlers import QueueHandler, QueueListener
+from dataclasses import dataclass
+from typing import Final, Optional
 
+from cachetools import TTLCache
 from telegram import Update
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, Forbidden, TelegramError
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -11,12 +18,24 @@ from telegram.ext import (
     ContextTypes,
     filters,
 )
+from telegram.request import HTTPXRequest
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # ========= Utils =========
+# str.translate memindai string sekali di level C; lebih cepat dari re.sub
+# dengan grup untuk character class sekecil ini.
+_MDV2_TABLE = {ord(c): '\\' + c for c in r'_*[]()~`>#+-=|{}.!'}
+# Satu scan C-level mengambil semua run digit sekaligus, tanpa loop Python
+_DIGIT_RUN_RE = re.compile(r'\d+')
+
+
 def escape_markdown_v2(text: str) -> str:
     """Escape special characters for MarkdownV2"""
-    escape_chars = r'_*[]()~`>#+-=|{}.!'
-    return re.sub(f'([{re.escape(escape_chars)}])', r'\\\1', str(text))
+    return text.translate(_MDV2_TABLE)
 
 
 def get_env_int(name: str, default: Optional[int] = None) -> Optional[int]:
@@ -29,6 +48,10 @@ def get_env_int(name: str, default: Optional[int] = None) -> Optional[int]:
         val = val[1:].strip()
     if val == "":
         return default
+    # Jalur cepat: angka desimal (termasuk negatif) lolos tanpa membangun
+    # exception; isdecimal menolak digit non-desimal yang int() juga tolak
+    if val.isdecimal() or (val.startswith("-") and val[1:].isdecimal()):
+        return int(val)
     try:
         return int(val)
     except ValueError:
@@ -37,113 +60,237 @@ def get_env_int(name: str, default: Optional[int] = None) -> Optional[int]:
 
 
 # ========= Logging =========
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
+# QueueHandler membuat emit() cuma berupa Queue.put: format + tulis ke stderr
+# terjadi di thread QueueListener, bukan di thread event loop.
+_log_queue: queue.Queue = queue.Queue(-1)
+_stream_handler = logging.StreamHandler()
+_stream_handler.setFormatter(
+    logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 )
+# Pasang QueueHandler langsung ke root (tanpa basicConfig) supaya tidak
+# ada formatter default yang membakar format ganda lewat prepare()
+_root_logger = logging.getLogger()
+_root_logger.addHandler(QueueHandler(_log_queue))
+_root_logger.setLevel(logging.INFO)
+_log_listener = QueueListener(_log_queue, _stream_handler)
 logger = logging.getLogger(__name__)
 
 
 # ========= Config via ENV =========
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-if not BOT_TOKEN:
-    raise RuntimeError("BOT_TOKEN env var is required")
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Konfigurasi bot, dibaca sekali dari ENV saat startup"""
+    token: str
+    target_user_id: Optional[int]  # integer, required for sending
+    webhook_base: Optional[str]  # e.g. https://your-app.up.railway.app
+    webhook_secret: Optional[str]  # dipakai Telegram untuk autentikasi request webhook
+    port: int
+    mode: str
+
+
+def load_config() -> Config:
+    """Baca semua env var sekali dan bekukan jadi Config"""
+    token = os.getenv("BOT_TOKEN")
+    if not token:
+        raise RuntimeError("BOT_TOKEN env var is required")
+
+    webhook_base = os.getenv("WEBHOOK_BASE")
+    # Auto-mode: webhook if WEBHOOK_BASE provided, else polling (override with MODE)
+    mode = (os.getenv("MODE") or ("webhook" if webhook_base else "polling")).lower().strip()
+
+    return Config(
+        token=token,
+        target_user_id=get_env_int("TARGET_USER_ID", None),
+        webhook_base=webhook_base,
+        webhook_secret=os.getenv("WEBHOOK_SECRET_TOKEN"),
+        port=int(os.getenv("PORT", "8080")),
+        mode=mode,
+    )
+
+# ========= Pesan statis =========
+_MSG_START: Final[str] = (
+    "🤖 *Bot Pengirim Nomor Telepon*\n\n"
+    "Silakan masukkan nomor telepon (contoh: 62858578089187)\n"
+    "Bot akan mengirim nomor tanpa kode negara (62) ke akun tujuan."
+)
+
+_MSG_HELP: Final[str] = (
+    "🤖 *Bot Pengirim Nomor Telepon*\n\n"
+    "*Cara Penggunaan:*\n"
+    "1. Ketik /start untuk memulai\n"
+    "2. Masukkan nomor telepon (contoh: 62858578089187)\n"
+    "3. Bot akan mengirim nomor tanpa kode '62' ke akun tujuan\n"
+    "4. Ulangi langkah 2 untuk nomor berikutnya\n\n"
+    "*Perintah yang tersedia:*\n"
+    "/start - Mulai proses input nomor\n"
+    "/help - Tampilkan bantuan ini\n"
+    "/myid - Lihat Chat ID Anda\n"
+    "/test - Test koneksi ke target user\n\n"
+    "*Contoh:*\n"
+    "Input: `62858578089187`\n"
+    "Output: `858578089187`"
+)
+
+_MSG_USE_START: Final[str] = "Gunakan /start untuk memulai proses input nomor telepon."
+
+_MSG_INVALID_INPUT: Final[str] = (
+    "❌ *Input tidak valid!*\n\n"
+    "Harap masukkan nomor telepon yang valid (minimal satu angka).\n"
+    "Contoh: 62858578089187"
+)
+
+_MSG_NO_TARGET: Final[str] = (
+    "⚠️ *TARGET_USER_ID belum dikonfigurasi di ENV!*\n\n"
+    "Set variabel lingkungan `TARGET_USER_ID` (angka) di Railway."
+)
+
+_MSG_TEST_NO_TARGET: Final[str] = (
+    "⚠️ *TARGET_USER_ID belum dikonfigurasi di ENV!*\n"
+    "Set `TARGET_USER_ID` di Railway, lalu coba lagi."
+)
+
+_MSG_ERR_CHAT_NOT_FOUND: Final[str] = (
+    "❌ *Target chat tidak ditemukan!*\n\n"
+    "User tujuan belum pernah /start bot ini.\n"
+    "Minta user tujuan untuk:\n"
+    "1. Klik /start pada bot ini\n"
+    "2. Kirim pesan apa saja ke bot"
+)
+
+_MSG_ERR_BLOCKED: Final[str] = (
+    "❌ *Bot diblokir oleh user tujuan!*\n\n"
+    "User tujuan telah memblokir bot ini.\n"
+    "Minta user untuk unblock bot terlebih dahulu."
+)
+
+_MSG_ERR_FORBIDDEN: Final[str] = (
+    "❌ *Tidak ada izin mengirim pesan!*\n\n"
+    "Pastikan user tujuan sudah /start bot ini."
+)
+
+_MSG_TEST_OK: Final[str] = (
+    "✅ *Test berhasil!*\n\nBot berhasil mengirim pesan ke target user."
+)
 
-TARGET_USER_ID = get_env_int("TARGET_USER_ID", None)  # integer, required for sending
-WEBHOOK_BASE = os.getenv("WEBHOOK_BASE")  # e.g. https://your-app.up.railway.app
-PORT = int(os.getenv("PORT", "8080"))
 
-# Auto-mode: webhook if WEBHOOK_BASE provided, else polling (override with MODE)
-MODE = (os.getenv("MODE") or ("webhook" if WEBHOOK_BASE else "polling")).lower().strip()
+# ========= Request dengan orjson =========
+class ORJSONRequest(HTTPXRequest):
+    """HTTPXRequest yang mem-parse respons Bot API dengan orjson (C-level)"""
+
+    def parse_json_payload(self, payload: bytes):
+        # Cermin error handling kelas induk: bungkus ValueError jadi
+        # TelegramError supaya retry loop PTB tetap menangkapnya.
+        try:
+            return orjson.loads(payload)
+        except ValueError as exc:
+            logger.error(
+                'Can not load invalid JSON data: "%s"',
+                payload.decode("utf-8", "replace"),
+            )
+            raise TelegramError("Invalid server response") from exc
+
+
+# Fallback mulus ke parser stdlib bila orjson tidak terpasang
+_REQUEST_CLS = ORJSONRequest if orjson is not None else HTTPXRequest
+
 
 # ========= Bot Logic =========
 class PhoneBot:
-    def __init__(self):
-        self.waiting_for_number = {}
+    def __init__(self, cfg: Config):
+        self.cfg = cfg
+        # TTL + maxsize membatasi memori untuk bot publik yang hidup lama:
+        # user yang /start lalu menghilang otomatis terusir setelah satu jam.
+        self.waiting_for_number: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         self.waiting_for_number[user_id] = True
 
-        await update.message.reply_text(
-            "🤖 *Bot Pengirim Nomor Telepon*\n\n"
-            "Silakan masukkan nomor telepon (contoh: 62858578089187)\n"
-            "Bot akan mengirim nomor tanpa kode negara (62) ke akun tujuan.",
-            parse_mode="Markdown",
-        )
+        await update.message.reply_text(_MSG_START, parse_mode=ParseMode.MARKDOWN)
 
     def process_phone_number(self, phone_number: str) -> str:
         """Proses nomor telepon: hapus karakter non-digit dan kode negara 62"""
-        clean_number = "".join(filter(str.isdigit, phone_number))
-        if clean_number.startswith("62"):
-            return clean_number[2:]
-        return clean_number
+        digits = "".join(_DIGIT_RUN_RE.findall(phone_number))
+        # Indexed compare menghindari dispatch method startswith di hot path
+        if len(digits) >= 2 and digits[0] == "6" and digits[1] == "2":
+            return digits[2:]
+        return digits
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
 
-        if not self.waiting_for_number.get(user_id, False):
-            await update.message.reply_text("Gunakan /start untuk memulai proses input nomor telepon.")
+        if user_id not in self.waiting_for_number:
+            await update.message.reply_text(_MSG_USE_START)
             return
 
         text = (update.message.text or "").strip()
-        digits_only = "".join(filter(str.isdigit, text))
+        # Input normal sudah berupa digit murni; lewati filter bila begitu
+        digits_only = text if text.isdigit() else "".join(_DIGIT_RUN_RE.findall(text))
 
         if not digits_only:
-            await update.message.reply_text(
-                "❌ *Input tidak valid!*\n\n"
-                "Harap masukkan nomor telepon yang valid (minimal satu angka).\n"
-                "Contoh: 62858578089187",
-                parse_mode="Markdown",
-            )
+            await update.message.reply_text(_MSG_INVALID_INPUT, parse_mode=ParseMode.MARKDOWN)
             return
 
-        processed_number = self.process_phone_number(text)
+        # digits_only sudah bersih, cukup buang prefix 62 tanpa filter ulang
+        processed_number = (
+            digits_only[2:]
+            if len(digits_only) >= 2 and digits_only[0] == "6" and digits_only[1] == "2"
+            else digits_only
+        )
 
-        if TARGET_USER_ID is None:
-            await update.message.reply_text(
-                "⚠️ *TARGET_USER_ID belum dikonfigurasi di ENV!*\n\n"
-                "Set variabel lingkungan `TARGET_USER_ID` (angka) di Railway.",
-                parse_mode="Markdown",
-            )
+        target_user_id = self.cfg.target_user_id
+        if target_user_id is None:
+            await update.message.reply_text(_MSG_NO_TARGET, parse_mode=ParseMode.MARKDOWN)
             return
 
-        try:
-            await context.bot.send_message(
-                chat_id=TARGET_USER_ID,
+        # Jalankan pengiriman di task terpisah supaya handler (dan ack HTTP 200
+        # webhook) selesai tanpa menunggu round-trip ke Bot API. create_task
+        # milik PTB dipakai agar task ikut di-track saat graceful shutdown.
+        context.application.create_task(
+            self._forward_number(update, context, text, processed_number, target_user_id),
+            update=update,
+        )
+
+    async def _forward_number(
+        self,
+        update: Update,
+        context: ContextTypes.DEFAULT_TYPE,
+        text: str,
+        processed_number: str,
+        target_user_id: int,
+    ):
+        """Kirim nomor ke target + ack ke user, di luar jalur request webhook"""
+        # Kirim ke target dan ack ke user sekaligus: latensi total = max(t1, t2),
+        # bukan t1 + t2, dan tiap pesan tetap dihitung terpisah oleh rate limit.
+        send_result, ack_result = await asyncio.gather(
+            context.bot.send_message(
+                chat_id=target_user_id,
                 text=f"`{processed_number}`",
-                parse_mode="Markdown",
-            )
-            await update.message.reply_text(
+                parse_mode=ParseMode.MARKDOWN,
+            ),
+            update.message.reply_text(
                 "✅ *Berhasil terkirim!*\n\n"
                 f"Nomor asli: `{text}`\n"
                 f"Nomor terkirim: `{processed_number}`\n\n"
                 "Masukkan nomor lagi atau gunakan /start untuk memulai ulang.",
-                parse_mode="Markdown",
-            )
+                parse_mode=ParseMode.MARKDOWN,
+            ),
+            return_exceptions=True,
+        )
+
+        if isinstance(ack_result, Exception):
+            logger.error("Error sending ack: %s", ack_result)
 
-        except Exception as e:
-            error_msg = str(e).lower()
+        if isinstance(send_result, TelegramError):
+            e = send_result
             logger.error("Error sending message: %s", e)
 
-            if "chat not found" in error_msg:
-                error_text = (
-                    "❌ *Target chat tidak ditemukan!*\n\n"
-                    "User tujuan belum pernah /start bot ini.\n"
-                    "Minta user tujuan untuk:\n"
-                    "1. Klik /start pada bot ini\n"
-                    "2. Kirim pesan apa saja ke bot"
-                )
-            elif "blocked" in error_msg:
-                error_text = (
-                    "❌ *Bot diblokir oleh user tujuan!*\n\n"
-                    "User tujuan telah memblokir bot ini.\n"
-                    "Minta user untuk unblock bot terlebih dahulu."
-                )
-            elif "forbidden" in error_msg:
+            if isinstance(e, BadRequest) and "chat not found" in str(e).lower():
+                error_text = _MSG_ERR_CHAT_NOT_FOUND
+            elif isinstance(e, Forbidden):
+                # Forbidden mencakup user yang memblokir bot maupun izin lain
                 error_text = (
-                    "❌ *Tidak ada izin mengirim pesan!*\n\n"
-                    "Pastikan user tujuan sudah /start bot ini."
+                    _MSG_ERR_BLOCKED if "blocked" in str(e).lower() else _MSG_ERR_FORBIDDEN
                 )
             else:
                 error_text = (
@@ -152,61 +299,44 @@ class PhoneBot:
                     "Silakan coba lagi atau hubungi administrator."
                 )
 
-            await update.message.reply_text(error_text, parse_mode="Markdown")
+            await update.message.reply_text(error_text, parse_mode=ParseMode.MARKDOWN)
+        elif isinstance(send_result, Exception):
+            raise send_result
 
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        help_text = (
-            "🤖 *Bot Pengirim Nomor Telepon*\n\n"
-            "*Cara Penggunaan:*\n"
-            "1. Ketik /start untuk memulai\n"
-            "2. Masukkan nomor telepon (contoh: 62858578089187)\n"
-            "3. Bot akan mengirim nomor tanpa kode '62' ke akun tujuan\n"
-            "4. Ulangi langkah 2 untuk nomor berikutnya\n\n"
-            "*Perintah yang tersedia:*\n"
-            "/start - Mulai proses input nomor\n"
-            "/help - Tampilkan bantuan ini\n"
-            "/myid - Lihat Chat ID Anda\n"
-            "/test - Test koneksi ke target user\n\n"
-            "*Contoh:*\n"
-            "Input: `62858578089187`\n"
-            "Output: `858578089187`"
-        )
-        await update.message.reply_text(help_text, parse_mode="Markdown")
+        await update.message.reply_text(_MSG_HELP, parse_mode=ParseMode.MARKDOWN)
 
     async def get_my_id(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        user_id = update.effective_user.id
-        username = update.effective_user.username or "Tidak ada username"
-        first_name = update.effective_user.first_name or "Tidak ada nama"
-
-        target_info = f"`{TARGET_USER_ID}`" if TARGET_USER_ID is not None else "_(belum diset)_"
+        # effective_user adalah property dengan rantai None-check; panggil sekali
+        user = update.effective_user
+        user_id = user.id
+        username = user.username or "Tidak ada username"
+        first_name = user.first_name or "Tidak ada nama"
+
+        target_user_id = self.cfg.target_user_id
+        target_info = f"`{target_user_id}`" if target_user_id is not None else "_(belum diset)_"
         await update.message.reply_text(
             "👤 *Info Akun Anda:*\n\n"
             f"Chat ID: `{user_id}`\n"
             f"Username: @{username}\n"
             f"Nama: {first_name}\n\n"
             f"Target saat ini: {target_info}",
-            parse_mode="Markdown",
+            parse_mode=ParseMode.MARKDOWN,
         )
 
     async def test_connection(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        if TARGET_USER_ID is None:
-            await update.message.reply_text(
-                "⚠️ *TARGET_USER_ID belum dikonfigurasi di ENV!*\n"
-                "Set `TARGET_USER_ID` di Railway, lalu coba lagi.",
-                parse_mode="Markdown",
-            )
+        target_user_id = self.cfg.target_user_id
+        if target_user_id is None:
+            await update.message.reply_text(_MSG_TEST_NO_TARGET, parse_mode=ParseMode.MARKDOWN)
             return
 
         try:
             await context.bot.send_message(
-                chat_id=TARGET_USER_ID,
+                chat_id=target_user_id,
                 text="🔄 Test koneksi dari bot"
             )
-            await update.message.reply_text(
-                "✅ *Test berhasil!*\n\nBot berhasil mengirim pesan ke target user.",
-                parse_mode="Markdown",
-            )
-        except Exception as e:
+            await update.message.reply_text(_MSG_TEST_OK, parse_mode=ParseMode.MARKDOWN)
+        except TelegramError as e:
             error_msg = str(e)
             logger.error("Test connection error: %s", error_msg)
             await update.message.reply_text(
@@ -216,14 +346,53 @@ class PhoneBot:
                 "1. Pastikan target user sudah /start bot ini\n"
                 "2. Cek Chat ID target user dengan /myid\n"
                 "3. Pastikan bot tidak diblokir target user",
-                parse_mode="Markdown",
+                parse_mode=ParseMode.MARKDOWN,
             )
 
 
 def main():
     """Main function untuk menjalankan bot (polling lokal / webhook Railway)"""
-    phone_bot = PhoneBot()
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
+    _log_listener.start()
+    try:
+        _run()
+    finally:
+        _log_listener.stop()
+
+
+def _run():
+    # Event loop libuv jauh lebih cepat untuk beban I/O seperti ini;
+    # opsional supaya bot tetap jalan di platform tanpa uvloop (Windows).
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+
+    cfg = load_config()
+    phone_bot = PhoneBot(cfg)
+
+    # Pool besar + HTTP/2: banyak send_message berbagi satu koneksi TLS,
+    # tanpa handshake ulang dan tanpa antre menunggu koneksi bebas.
+    request = _REQUEST_CLS(
+        connection_pool_size=256,
+        http_version="2",
+        connect_timeout=5.0,
+        read_timeout=10.0,
+        write_timeout=10.0,
+        pool_timeout=1.0,
+    )
+    get_updates_request = _REQUEST_CLS(http_version="2", connect_timeout=5.0)
+
+    application = (
+        ApplicationBuilder()
+        .token(cfg.token)
+        .request(request)
+        .get_updates_request(get_updates_request)
+        # Proses update secara paralel (dibatasi 256 task) alih-alih serial;
+        # akses waiting_for_number aman karena operasi tunggal dilindungi GIL.
+        .concurrent_updates(256)
+        .build()
+    )
 
     # Handlers
     application.add_handler(CommandHandler("start", phone_bot.start))
@@ -232,22 +401,32 @@ def main():
     application.add_handler(CommandHandler("test", phone_bot.test_connection))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, phone_bot.handle_message))
 
-    print(f"🤖 Mode: {MODE.upper()}")
-    if MODE == "webhook":
-        if not WEBHOOK_BASE:
+    logger.info("🤖 Mode: %s", cfg.mode.upper())
+    if cfg.mode == "webhook":
+        if not cfg.webhook_base:
             raise RuntimeError("WEBHOOK_BASE env var is required for webhook mode")
-        url_path = BOT_TOKEN
-        webhook_url = f"{WEBHOOK_BASE.rstrip('/')}/{url_path}"
-        print(f"🌐 Setting webhook: {webhook_url}")
+        url_path = cfg.token
+        webhook_url = f"{cfg.webhook_base.rstrip('/')}/{url_path}"
+        logger.info("🌐 Setting webhook: %s", webhook_url)
         application.run_webhook(
             listen="0.0.0.0",
-            port=PORT,
+            port=cfg.port,
             url_path=url_path,
             webhook_url=webhook_url,
+            secret_token=cfg.webhook_secret,
+            # Buang antrean lama saat deploy ulang; set False bila update
+            # yang tertunda tetap harus diproses setelah restart.
             drop_pending_updates=True,
         )
     else:
-        print("📡 Running with polling (lokal/dev).")
+        if cfg.webhook_base:
+            # Polling membuang CPU/latensi untuk round-trip getUpdates;
+            # webhook jauh lebih responsif di produksi.
+            logger.warning(
+                "WEBHOOK_BASE terpasang tapi MODE=polling; "
+                "gunakan MODE=webhook untuk latensi lebih rendah di produksi."
+            )
+        logger.info("📡 Running with polling (lokal/dev).")
         application.run_polling(drop_pending_updates=True)
 
 